@@ -0,0 +1,69 @@
+# Benchmark: build N log embeds ("Command used" style) with the old
+# per-call make_embed vs EmbedTemplate (expected to be at parity: both use the
+# public Embed API), plus header patching, which is where the saving is.
+# Usage: python bench_embeds.py [N]   (default 100000)
+import sys
+import time
+
+import discord
+
+from util_embeds import EmbedTemplate, patch_field
+
+COLOR = 0x5865F2
+NAME, ICON, BANNER, FOOTER = "Nuvix Tickets", "https://example.com/icon.png", "https://example.com/banner.png", "Nuvix • Your wishes, more cheap!"
+
+
+def legacy_make_embed(title: str, description: str = "") -> discord.Embed:
+    e = discord.Embed(title=title, description=description, color=COLOR)
+    e.set_author(name=NAME, icon_url=ICON)
+    e.set_thumbnail(url=BANNER)
+    e.set_footer(text=FOOTER)
+    return e
+
+
+def legacy_rebuild_header(e: discord.Embed, mention: str) -> discord.Embed:
+    new = legacy_make_embed(e.title or "Support Ticket", e.description or "")
+    for f in e.fields:
+        if f.name.lower().startswith("assigned"):
+            continue
+        new.add_field(name=f.name, value=f.value, inline=f.inline)
+    new.add_field(name="Assigned staff", value=mention, inline=False)
+    return new
+
+
+def timed(label: str, n: int, fn):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    dt = time.perf_counter() - t0
+    print(f"{label:<28} {dt:7.3f}s  {dt / n * 1e6:6.2f} µs/embed")
+    return dt
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    tpl = EmbedTemplate.branded(color=COLOR, author=NAME, icon_url=ICON, thumbnail_url=BANNER, footer=FOOTER)
+    desc = "`/{}` by <@1234567890> in <#9876543210>"
+    assert legacy_make_embed("Command used", desc).to_dict() == tpl.build("Command used", desc).to_dict()
+
+    print(f"Building {n} log embeds")
+    old = timed("make_embed (per call)", n, lambda i: legacy_make_embed("Command used", desc.format(i)))
+    new = timed("EmbedTemplate.build", n, lambda i: tpl.build("Command used", desc.format(i)))
+    print(f"speedup: {old / new:.2f}x")
+
+    print(f"\nBuilding + serializing {n} log embeds (to_dict, as sent to the API)")
+    old = timed("make_embed (per call)", n, lambda i: legacy_make_embed("Command used", desc.format(i)).to_dict())
+    new = timed("EmbedTemplate.build", n, lambda i: tpl.build("Command used", desc.format(i)).to_dict())
+    print(f"speedup: {old / new:.2f}x")
+
+    header = tpl.derive(fields=[("Assigned staff", "*(none yet)*", False)]).build(
+        "Support Ticket", "Please wait…", fields=[("Form Details", "**Request:** help", False)]
+    )
+    print(f"\nUpdating the assigned staff field {n} times")
+    old = timed("rebuild header", n, lambda i: legacy_rebuild_header(header, f"<@{i}>"))
+    new = timed("patch_field", n, lambda i: patch_field(header, "assigned", "Assigned staff", f"<@{i}>"))
+    print(f"speedup: {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
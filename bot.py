@@ -13,6 +13,9 @@
 
 from __future__ import annotations
 
+import time
+_T_START = time.perf_counter()
+
 # ---------- Patch audioop for Python 3.12+/3.13 -----------
 import sys, types
 if "audioop" not in sys.modules:
@@ -34,33 +37,48 @@ if "audioop" not in sys.modules:
 import os
 import io
 import json
+import hashlib
+import math
+import asyncio
+import tempfile
+import re
 import traceback
 import datetime as dt
-from typing import Optional, Dict
+from typing import Awaitable, Callable, Optional, Dict, Tuple
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
+from util_embeds import EmbedTemplate, patch_field
+from util_eventlog import EventLog
+from util_inactivity import InactivityScheduler
+from util_index import FormIndex
+from util_queue import TicketQueue
+from util_ratelimit import AdmissionControl, AdmissionQueue, AdmissionRejected, RateLimited, RateLimiter
+
 # ─────────────────────────────────────────────────────────────────────────────
 # KEEPALIVE (para Render / Web Service)
 # ─────────────────────────────────────────────────────────────────────────────
-import os
-from flask import Flask
-from threading import Thread
-
 KEEPALIVE = os.getenv("KEEPALIVE", "0") == "1"
 
-if KEEPALIVE:
+def start_keepalive():
+    # Flask and threading are only imported when the keepalive server is enabled
+    from threading import Thread
+    from flask import Flask
+
     app = Flask(__name__)
 
     @app.route("/")
     def home():
         return {"ok": True, "service": "nuvix-tickets"}
 
-    def run_flask():
-        port = int(os.getenv("PORT", "10000"))
-        app.run(host="0.0.0.0", port=port, debug=False)
+    @app.route("/metrics")
+    def metrics():
+        return admission_stats()
+
+    port = int(os.getenv("PORT", "10000"))
+    Thread(target=app.run, kwargs={"host": "0.0.0.0", "port": port, "debug": False}, daemon=True).start()
 
 # -------------------- Environment --------------------
 TOKEN = os.getenv("NUVIX_TICKETS_TOKEN") or os.getenv("TOKEN")
@@ -103,10 +121,32 @@ NOT_RECEIVED_CATEGORY_ID  = int(os.getenv("NOT_RECEIVED_CATEGORY_ID", "0") or 0)
 REPLACE_CATEGORY_ID       = int(os.getenv("REPLACE_CATEGORY_ID", "0") or 0)
 SUPPORT_CATEGORY_ID       = int(os.getenv("SUPPORT_CATEGORY_ID", "0") or 0)
 
-# ─────────────────────────────────────────────────────────────────────────────
-import discord
-from discord.ext import commands
+# Rate limits for panel/ticket creation and staff control buttons, as
+# "count/seconds" token buckets (burst = count); "0/1" disables a limit.
+def _env_rate(name: str, default: str) -> Tuple[float, float]:
+    count, _, seconds = (os.getenv(name) or default).partition("/")
+    return float(count) / float(seconds or 1), float(count)
+
+RL_TICKET_USER   = _env_rate("RL_TICKET_USER", "2/300")
+RL_TICKET_GUILD  = _env_rate("RL_TICKET_GUILD", "20/60")
+RL_CONTROL_USER  = _env_rate("RL_CONTROL_USER", "20/60")
+RL_CONTROL_GUILD = _env_rate("RL_CONTROL_GUILD", "120/60")
+# Concurrent admitted operations, and how many may wait behind them (per class: tickets, controls)
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "4") or 4)
+ADMISSION_MAX_QUEUE    = int(os.getenv("ADMISSION_MAX_QUEUE", "20") or 20)
+
+# Ticket lifecycle event log (JSONL + snapshots) directory
+EVENTS_DIR = os.getenv("EVENTS_DIR", "events")
+
+# Inactivity: remind the opener after IDLE_REMIND_HOURS without messages,
+# then auto-close IDLE_CLOSE_HOURS after the reminder (0 disables either step)
+IDLE_REMIND_HOURS = float(os.getenv("IDLE_REMIND_HOURS", "24") or 0)
+IDLE_CLOSE_HOURS  = float(os.getenv("IDLE_CLOSE_HOURS", "24") or 0)
+
+# Print import / setup_hook / time-to-ready timings on startup
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
 
+# ─────────────────────────────────────────────────────────────────────────────
 intents = discord.Intents.default()
 intents.messages = True
 intents.guilds = True
@@ -121,23 +161,26 @@ class NuvixBot(commands.Bot):
             intents=intents,
         )
 
+    async def close(self):
+        # Don't lose buffered events / activity timestamps on shutdown
+        await EVENTS.flush()
+        await IDLE.flush()
+        await super().close()
+
     async def setup_hook(self):
+        t0 = time.perf_counter()
+        # Mantener los botones activos (before anything slow or fallible)
+        self.add_view(TicketPanelView())
+        self.add_view(TicketControlsView())
+
+        load_state()
+
         # Sincroniza slash commands automáticamente al iniciar
         try:
-            if GUILD_ID and GUILD_ID != 0:
-                guild = discord.Object(id=GUILD_ID)
-                synced = await self.tree.sync(guild=guild)
-                print(f"[SYNC] {len(synced)} comandos sincronizados en guild {GUILD_ID}")
-            else:
-                synced = await self.tree.sync()
-                print(f"[SYNC] {len(synced)} comandos sincronizados globalmente")
-
-            # Mantener los botones activos
-            self.add_view(TicketPanelView())
-            self.add_view(TicketControlsView())
-
+            await sync_commands()
         except Exception as e:
             print(f"[SYNC ERROR] {e}")
+        PROFILE["setup_hook"] = time.perf_counter() - t0
 
 # -------------------- Helper Functions --------------------
 def now_utc_str() -> str:
@@ -149,16 +192,20 @@ def is_staff(member: discord.Member) -> bool:
     staff_ids = {r.id for r in member.roles}
     return any(rid in staff_ids for rid in STAFF_ROLE_IDS)
 
+# Embed templates: branding is built once, each embed only fills what varies
+BASE_EMBED = EmbedTemplate.branded(color=THEME_COLOR, author=BOT_NAME, icon_url=ICON_URL, thumbnail_url=BANNER_URL, footer=FOOTER_TEXT)
+HEADER_EMBED = BASE_EMBED.derive(
+    description=(
+        "Please wait until one of our support team members can help you.\n"
+        "**Response time may vary due to many factors, so please be patient.**"
+    ),
+    # Assigned staff field starts empty; set_assignee patches it in place
+    fields=[("Assigned staff", "*(none yet)*", False)],
+)
+REVIEW_EMBED = BASE_EMBED.derive(title="New Ticket Review")
+
 def make_embed(title: str, description: str = "", color: Optional[int] = None) -> discord.Embed:
-    e = discord.Embed(title=title, description=description, color=color or THEME_COLOR)
-    if ICON_URL:
-        e.set_author(name=BOT_NAME, icon_url=ICON_URL)
-    else:
-        e.set_author(name=BOT_NAME)
-    if BANNER_URL:
-        e.set_thumbnail(url=BANNER_URL)
-    e.set_footer(text=FOOTER_TEXT)
-    return e
+    return BASE_EMBED.build(title, description, color)
 
 async def log_to(channel_id: int, *, embed: Optional[discord.Embed] = None, content: Optional[str] = None, file: Optional[discord.File] = None):
     if not channel_id:
@@ -193,6 +240,202 @@ def save_blacklist():
     except Exception:
         pass
 
+# -------------------- Event log (lifecycle history) --------------------
+# create / assign / unassign / priority / add / remove / close. History only
+# (TICKETS is the live state); /export_events streams it as a gzipped file.
+EVENTS = EventLog(EVENTS_DIR)
+
+# -------------------- Open tickets (persist to file) --------------------
+# channel_id -> {"guild_id", "opener_id", "kind", "created_at", "status", "transcript_sent", "priority", "assigned_id"}
+# status is "open" or "closing"; a "closing" record whose channel still exists
+# is an interrupted close and is finished by reconcile_tickets() on startup.
+TICKETS_PATH = "tickets.json"
+try:
+    with open(TICKETS_PATH, "r", encoding="utf-8") as f:
+        TICKETS: Dict[int, dict] = {int(k): v for k, v in json.load(f).items()}
+except Exception:
+    TICKETS = {}
+
+def save_tickets():
+    try:
+        with open(TICKETS_PATH, "w", encoding="utf-8") as f:
+            json.dump({str(k): v for k, v in TICKETS.items()}, f)
+    except Exception:
+        pass
+
+def forget_ticket(channel_id: int):
+    if TICKETS.pop(channel_id, None) is not None:
+        save_tickets()
+    IDLE.untrack(channel_id)
+    QUEUE.remove(channel_id)
+    FORM_INDEX.mark_closed(channel_id, dt.datetime.now(dt.timezone.utc).timestamp())
+
+# -------------------- Form index (duplicate invoice detection) --------------------
+# Every submitted form field, open and closed tickets alike
+FORM_INDEX = FormIndex("tickets_index.db")
+INVOICE_FIELDS = ("Invoice ID", "Invoice/Order ID")
+
+FORM_LINE_RE = re.compile(r"^\*\*(.+?):\*\* (.*)$")
+
+async def backfill_form_index():
+    """Index open tickets opened before the form index existed, from their header embeds."""
+    indexed = FORM_INDEX.indexed_ids()
+    added = 0
+    for cid, rec in list(TICKETS.items()):
+        ch = bot.get_channel(cid)
+        if cid in indexed or not isinstance(ch, discord.TextChannel):
+            continue
+        fields: Dict[str, str] = {}
+        try:
+            async for m in ch.history(limit=50, oldest_first=True):
+                if m.author == bot.user and m.embeds:
+                    for f in m.embeds[0].fields:
+                        if f.name == "Form Details":
+                            for line in (f.value or "").splitlines():
+                                lm = FORM_LINE_RE.match(line)
+                                if lm:
+                                    fields[lm.group(1)] = lm.group(2)
+                    break
+        except discord.HTTPException as e:
+            print(f"[INDEX] backfill skipped {cid}: {e}")
+            continue
+        FORM_INDEX.add(cid, ch.name, rec.get("opener_id"), rec.get("kind"), rec["created_at"], fields)
+        added += 1
+    if added:
+        print(f"[INDEX] backfilled {added} open tickets")
+
+def describe_indexed_ticket(row) -> str:
+    state = f"closed <t:{int(row['closed_at'])}:R>" if row["closed_at"] else f"open <#{row['channel_id']}>"
+    opener = f"<@{row['opener_id']}>" if row["opener_id"] else "*unknown opener*"
+    return f"**#{row['channel_name']}** • {row['kind']} • {opener} • opened <t:{int(row['created_at'])}:d> • {state}"
+
+# -------------------- Staff queue (priority → age → unassigned) --------------------
+QUEUE = TicketQueue()
+
+def queue_ticket(channel_id: int):
+    rec = TICKETS.get(channel_id)
+    if rec is None or rec.get("status", "open") != "open":
+        QUEUE.remove(channel_id)
+    else:
+        QUEUE.upsert(channel_id, rec.get("priority", "normal"), rec["created_at"], bool(rec.get("assigned_id")))
+
+# The [P:level] topic tag is only a mirror of TICKETS[...]["priority"]. Topic edits
+# share Discord's 2-per-10-minutes channel edit limit, so they are coalesced: one
+# pending sync per channel, written TOPIC_SYNC_DELAY later with the latest level.
+TOPIC_SYNC_DELAY = 300
+PRIORITY_TAG_RE = re.compile(r"\s*\[P:(low|normal|high|critical)\]")
+_topic_syncs: Dict[int, asyncio.Task] = {}
+
+def schedule_topic_sync(channel_id: int):
+    if channel_id not in _topic_syncs:
+        _topic_syncs[channel_id] = asyncio.create_task(_sync_topic(channel_id))
+
+async def _sync_topic(channel_id: int):
+    try:
+        await asyncio.sleep(TOPIC_SYNC_DELAY)
+        ch = bot.get_channel(channel_id)
+        rec = TICKETS.get(channel_id)
+        if not isinstance(ch, discord.TextChannel) or rec is None:
+            return
+        topic = PRIORITY_TAG_RE.sub("", ch.topic or "")
+        topic = f"{topic} [P:{rec.get('priority', 'normal')}]".strip()
+        if topic != (ch.topic or ""):
+            await ch.edit(topic=topic)
+    except discord.HTTPException as e:
+        print(f"[TOPIC] sync failed for {channel_id}: {e}")
+    finally:
+        _topic_syncs.pop(channel_id, None)
+
+# -------------------- Inactivity (remind + auto-close) --------------------
+async def remind_idle_ticket(channel_id: int):
+    ch = bot.get_channel(channel_id)
+    rec = TICKETS.get(channel_id)
+    if not isinstance(ch, discord.TextChannel) or rec is None:
+        IDLE.untrack(channel_id)
+        return
+    ping = f"<@{rec['opener_id']}> " if rec.get("opener_id") else ""
+    msg = f"{ping}This ticket has been inactive for {IDLE_REMIND_HOURS:g}h."
+    if IDLE_CLOSE_HOURS:
+        msg += f" It will be closed automatically in {IDLE_CLOSE_HOURS:g}h unless someone replies."
+    await ch.send(msg)
+    EVENTS.append("idle_reminder", channel_id=channel_id)
+
+async def close_idle_ticket(channel_id: int):
+    ch = bot.get_channel(channel_id)
+    if not isinstance(ch, discord.TextChannel):
+        forget_ticket(channel_id)
+        return
+    await archive_ticket(ch, closed_by="inactivity")
+    try:
+        await ch.delete(reason="Closed for inactivity")
+    except discord.Forbidden:
+        pass
+
+IDLE = InactivityScheduler(
+    "idle_state.json",
+    remind_after=IDLE_REMIND_HOURS * 3600,
+    close_after=IDLE_CLOSE_HOURS * 3600,
+    on_remind=remind_idle_ticket,
+    on_close=close_idle_ticket,
+)
+
+def load_state():
+    """Restore the event log position and rebuild idle deadlines + the staff queue (from setup_hook)."""
+    EVENTS.replay()
+    IDLE.load()
+    for cid, rec in TICKETS.items():
+        if rec.get("status", "open") == "open":
+            IDLE.track(cid, rec.get("created_at"))
+            queue_ticket(cid)
+
+# -------------------- Admission control --------------------
+TICKET_LIMITS = AdmissionControl(
+    "tickets", RateLimiter(*RL_TICKET_USER), RateLimiter(*RL_TICKET_GUILD),
+    AdmissionQueue(ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE),
+)
+CONTROL_LIMITS = AdmissionControl(
+    "controls", RateLimiter(*RL_CONTROL_USER), RateLimiter(*RL_CONTROL_GUILD),
+    AdmissionQueue(ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE),
+)
+
+def admission_stats() -> dict:
+    return {lim.name: lim.stats() for lim in (TICKET_LIMITS, CONTROL_LIMITS)}
+
+async def reply(interaction: discord.Interaction, content: str, **kwargs):
+    """Ephemeral answer that works whether or not the interaction was deferred."""
+    if interaction.response.is_done():
+        await interaction.followup.send(content, ephemeral=True, **kwargs)
+    else:
+        await interaction.response.send_message(content, ephemeral=True, **kwargs)
+
+async def reject_rate_limited(interaction: discord.Interaction, e: RateLimited):
+    await reply(interaction, f"Too many requests right now — please try again in {math.ceil(e.retry_after)}s.")
+
+async def run_admitted(interaction: discord.Interaction, limits: AdmissionControl, work: Callable[[], Awaitable[None]]):
+    """Run `work` only if the user/guild buckets allow it and a slot in the class's queue is free.
+
+    The interaction is deferred before queueing so a wait for a slot plus the
+    REST work can't run past Discord's 3s response deadline; `work` answers
+    through reply(). Tokens are only taken once a slot is held, so a queue
+    rejection doesn't cost the user any of their budget.
+    """
+    uid, gid = interaction.user.id, interaction.guild_id or 0
+    try:
+        limits.check(uid, gid, consume=False)
+    except RateLimited as e:
+        await reject_rate_limited(interaction, e)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        async with limits.queue.slot():
+            limits.check(uid, gid)
+            await work()
+    except AdmissionRejected as e:
+        limits.counters["rejected_queue"] += 1
+        await reject_rate_limited(interaction, e)
+    except RateLimited as e:
+        await reject_rate_limited(interaction, e)
+
 # -------------------- Ticket Panel (Nebula-like) --------------------
 class PurchasesModal(discord.ui.Modal, title="Purchases"):
     item = discord.ui.TextInput(
@@ -310,6 +553,15 @@ class TicketPanelView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
 
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Turn users away before they fill the form; create_ticket takes the token
+        try:
+            TICKET_LIMITS.check(interaction.user.id, interaction.guild_id or 0, consume=False)
+        except RateLimited as e:
+            await reject_rate_limited(interaction, e)
+            return False
+        return True
+
     @discord.ui.button(label="Support", style=discord.ButtonStyle.blurple, emoji="🎟️", custom_id="nuvix:support")
     async def btn_support(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_modal(SupportModal(interaction.user))
@@ -332,14 +584,22 @@ async def create_ticket(
     kind: str,
     opener: discord.Member,
     fields: Dict[str, str],
+):
+    await run_admitted(interaction, TICKET_LIMITS, lambda: _create_ticket(interaction, kind, opener, fields))
+
+async def _create_ticket(
+    interaction: discord.Interaction,
+    kind: str,
+    opener: discord.Member,
+    fields: Dict[str, str],
 ):
     guild = interaction.guild
     if guild is None:
-        await interaction.response.send_message("Use this inside a server.", ephemeral=True)
+        await reply(interaction, "Use this inside a server.")
         return
 
     if opener.id in BLACKLIST:
-        await interaction.response.send_message("You are blacklisted from creating tickets.", ephemeral=True)
+        await reply(interaction, "You are blacklisted from creating tickets.")
         return
 
     cat = await get_category(guild, kind)
@@ -368,6 +628,7 @@ async def create_ticket(
         name=channel_name,
         category=cat,
         overwrites=overwrites,
+        topic=f"Ticket {kind} • opener:{opener.id}",
         reason=f"Ticket opened by {opener} ({kind})",
     )
 
@@ -377,21 +638,43 @@ async def create_ticket(
         "not_received": "Product not received",
         "replace": "Replace Ticket",
     }
-    e = make_embed(title_map.get(kind, "Support Ticket"))
-    e.description = (
-        "Please wait until one of our support team members can help you.\n"
-        "**Response time may vary due to many factors, so please be patient.**"
-    )
-    # Assigned staff field starts empty
-    e.add_field(name="Assigned staff", value="*(none yet)*", inline=False)
     # Form details
     details = "\n".join(f"**{k}:** {v}" for k, v in fields.items()) or "*No data*"
-    e.add_field(name="Form Details", value=details, inline=False)
+    e = HEADER_EMBED.build(title_map.get(kind, "Support Ticket"), fields=[("Form Details", details, False)])
+
+    # Invoices already claimed in another ticket are flagged to staff only (logs below)
+    dupes = {}
+    for k in INVOICE_FIELDS:
+        if fields.get(k):
+            for row in FORM_INDEX.lookup(fields[k], INVOICE_FIELDS, exclude=ch.id):
+                dupes[row["channel_id"]] = row
 
     await ch.send(content=opener.mention, embed=e, view=TicketControlsView())
 
-    await interaction.response.send_message(f"Ticket created: {ch.mention}", ephemeral=True)
+    TICKETS[ch.id] = {
+        "guild_id": guild.id,
+        "opener_id": opener.id,
+        "kind": kind,
+        "created_at": dt.datetime.now(dt.timezone.utc).timestamp(),
+        "status": "open",
+        "transcript_sent": False,
+        "priority": "normal",
+        "assigned_id": None,
+    }
+    save_tickets()
+    IDLE.track(ch.id)
+    queue_ticket(ch.id)
+    FORM_INDEX.add(ch.id, ch.name, opener.id, kind, TICKETS[ch.id]["created_at"], fields)
+    EVENTS.append("ticket_created", channel_id=ch.id, actor_id=opener.id, kind=kind, fields=fields, duplicate_of=list(dupes))
+
+    await reply(interaction, f"Ticket created: {ch.mention}")
     await log_to(TICKETS_LOGS_CHANNEL_ID, embed=make_embed("Ticket Created", f"**Type:** {kind}\n**User:** {opener.mention}\n**Channel:** {ch.mention}"))
+    if dupes:
+        await log_to(TICKETS_LOGS_CHANNEL_ID, embed=make_embed(
+            "⚠️ Duplicate invoice claim",
+            f"{ch.mention} by {opener.mention} reuses an invoice from {len(dupes)} other ticket(s):\n"
+            + "\n".join(describe_indexed_ticket(r) for r in list(dupes.values())[:5]),
+        ))
 
 class TicketControlsView(discord.ui.View):
     def __init__(self):
@@ -402,14 +685,14 @@ class TicketControlsView(discord.ui.View):
         if not isinstance(interaction.user, discord.Member) or not is_staff(interaction.user):
             await interaction.response.send_message("Only staff can assign.", ephemeral=True)
             return
-        await assign_staff(interaction, interaction.user)
+        await run_admitted(interaction, CONTROL_LIMITS, lambda: assign_staff(interaction, interaction.user))
 
     @discord.ui.button(label="Close Ticket", style=discord.ButtonStyle.danger, emoji="🔒", custom_id="nuvix:close")
     async def close(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not isinstance(interaction.user, discord.Member) or not is_staff(interaction.user):
             await interaction.response.send_message("Only staff can close.", ephemeral=True)
             return
-        await close_ticket(interaction)
+        await run_admitted(interaction, CONTROL_LIMITS, lambda: close_ticket(interaction))
 
 # -------------------- Transcript & Review --------------------
 async def render_transcript_html(channel: discord.TextChannel) -> bytes:
@@ -465,10 +748,11 @@ async def send_review_request(user: discord.User, ticket_channel: discord.TextCh
             async def on_submit(self, interaction: discord.Interaction):
                 stars = int(self.stars)
                 comment = str(self.extra).strip() if self.extra else ""
-                emb = make_embed("New Ticket Review")
-                emb.add_field(name="Stars", value=f"{'⭐'*stars} ({stars}/5)", inline=False)
-                emb.add_field(name="User", value=interaction.user.mention, inline=True)
-                emb.add_field(name="Ticket", value=ticket_channel.mention, inline=True)
+                emb = REVIEW_EMBED.build(fields=[
+                    ("Stars", f"{'⭐'*stars} ({stars}/5)", False),
+                    ("User", interaction.user.mention, True),
+                    ("Ticket", ticket_channel.mention, True),
+                ])
                 if comment:
                     emb.add_field(name="Comment", value=comment, inline=False)
                 await log_to(REVIEWS_CHANNEL_ID, embed=emb)
@@ -481,16 +765,28 @@ async def send_review_request(user: discord.User, ticket_channel: discord.TextCh
     except Exception:
         pass
 
-async def close_ticket(interaction: discord.Interaction):
-    ch = interaction.channel
-    assert isinstance(ch, discord.TextChannel)
+async def archive_ticket(ch: discord.TextChannel, closed_by: str):
+    """Transcript, opener DM + review request and close log; the caller deletes the channel.
+
+    The record stays in TICKETS as "closing" until on_guild_channel_delete drops it,
+    so a restart in between is picked up by reconcile_tickets().
+    """
+    rec = TICKETS.get(ch.id)
+    if rec is not None:
+        rec["status"] = "closing"
+        save_tickets()
+    IDLE.untrack(ch.id)
+    QUEUE.remove(ch.id)
 
-    # Try to find ticket opener (first non-bot mention in first bot message)
     opener: Optional[discord.Member] = None
-    async for m in ch.history(limit=30, oldest_first=True):
-        if m.mentions:
-            opener = m.mentions[0]
-            break
+    if rec and rec.get("opener_id"):
+        opener = ch.guild.get_member(rec["opener_id"])
+    if opener is None:
+        # Try to find ticket opener (first non-bot mention in first bot message)
+        async for m in ch.history(limit=30, oldest_first=True):
+            if m.mentions:
+                opener = m.mentions[0]
+                break
 
     # Transcript
     data = await render_transcript_html(ch)
@@ -498,6 +794,9 @@ async def close_ticket(interaction: discord.Interaction):
 
     # Send transcript to Transcripts channel
     await log_to(TRANSCRIPTS_CHANNEL_ID, content=f"Transcript for {ch.mention}", file=file)
+    if rec is not None:
+        rec["transcript_sent"] = True
+        save_tickets()
 
     # DM transcript + review form
     if opener:
@@ -508,16 +807,31 @@ async def close_ticket(interaction: discord.Interaction):
         except Exception:
             pass
 
-    await log_to(TICKETS_LOGS_CHANNEL_ID, embed=make_embed("Ticket Closed", f"Channel: {ch.mention}\nBy: {interaction.user.mention}"))
-    await interaction.response.send_message("Closing ticket…", ephemeral=True)
+    await log_to(TICKETS_LOGS_CHANNEL_ID, embed=make_embed("Ticket Closed", f"Channel: {ch.mention}\nBy: {closed_by}"))
+    EVENTS.append("ticket_closed", channel_id=ch.id, closed_by=closed_by)
+
+async def close_ticket(interaction: discord.Interaction):
+    ch = interaction.channel
+    assert isinstance(ch, discord.TextChannel)
+
+    await archive_ticket(ch, closed_by=interaction.user.mention)
+    await reply(interaction, "Closing ticket…")
     try:
         await ch.delete(reason=f"Closed by {interaction.user}")
     except discord.Forbidden:
         await interaction.followup.send("I couldn't delete the channel (missing permissions).", ephemeral=True)
 
-async def assign_staff(interaction: discord.Interaction, member: discord.Member):
-    ch = interaction.channel
-    assert isinstance(ch, discord.TextChannel)
+async def set_assignee(ch: discord.TextChannel, member: Optional[discord.Member], actor: discord.abc.User):
+    """Record the assignee (None to unassign) and mirror it in the header embed."""
+    rec = TICKETS.get(ch.id)
+    if rec is not None:
+        rec["assigned_id"] = member.id if member else None
+        save_tickets()
+        queue_ticket(ch.id)
+    if member:
+        EVENTS.append("ticket_assigned", channel_id=ch.id, actor_id=actor.id, assignee_id=member.id)
+    else:
+        EVENTS.append("ticket_unassigned", channel_id=ch.id, actor_id=actor.id)
 
     # Find first bot embed in the ticket channel
     base_msg = None
@@ -527,18 +841,131 @@ async def assign_staff(interaction: discord.Interaction, member: discord.Member)
             break
 
     if base_msg and base_msg.embeds:
-        e = base_msg.embeds[0]
-        # Rebuild to preserve theme/footer/author
-        new = make_embed(e.title or "Support Ticket", e.description or "")
-        # Keep fields except "Assigned staff"
-        for f in e.fields:
-            if f.name.lower().startswith("assigned"):
-                continue
-            new.add_field(name=f.name, value=f.value, inline=f.inline)
-        new.add_field(name="Assigned staff", value=member.mention, inline=False)
-        await base_msg.edit(embed=new)
-
-    await interaction.response.send_message(f"Assigned to {member.mention}.", ephemeral=True)
+        # Only the "Assigned staff" field changes; theme/footer/author come back with the embed
+        e = patch_field(base_msg.embeds[0], "assigned", "Assigned staff", member.mention if member else "*(none yet)*")
+        await base_msg.edit(embed=e)
+
+async def assign_staff(interaction: discord.Interaction, member: discord.Member):
+    ch = interaction.channel
+    assert isinstance(ch, discord.TextChannel)
+    await set_assignee(ch, member, interaction.user)
+    await reply(interaction, f"Assigned to {member.mention}.")
+
+class QueueView(discord.ui.View):
+    def __init__(self):
+        super().__init__(timeout=600)
+
+    @discord.ui.button(label="Claim next", style=discord.ButtonStyle.success, emoji="📥")
+    async def claim_next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not isinstance(interaction.user, discord.Member) or not is_staff(interaction.user):
+            await interaction.response.send_message("Only staff can claim tickets.", ephemeral=True)
+            return
+        await run_admitted(interaction, CONTROL_LIMITS, lambda: self._claim(interaction))
+
+    async def _claim(self, interaction: discord.Interaction):
+        cid = QUEUE.first(lambda c: not TICKETS[c].get("assigned_id"))
+        ch = bot.get_channel(cid) if cid else None
+        if not isinstance(ch, discord.TextChannel):
+            await reply(interaction, "No unassigned tickets in the queue.")
+            return
+        # Pick + mark happen before the first await, so two staff can't claim the same ticket
+        TICKETS[cid]["assigned_id"] = interaction.user.id
+        queue_ticket(cid)
+        await reply(interaction, f"You claimed {ch.mention}.")
+        await set_assignee(ch, interaction.user, interaction.user)
+
+# -------------------- Startup reconciliation --------------------
+TICKET_PREFIXES = {"supp-": "support", "purch-": "purchases", "nrcv-": "not_received", "repl-": "replace"}
+TOPIC_OPENER_RE = re.compile(r"opener:(\d+)")
+TOPIC_KIND_RE = re.compile(r"^Ticket (\w+)")
+_reconciled = False
+_backfill_task: Optional[asyncio.Task] = None  # held so the task isn't garbage-collected mid-run
+
+def ticket_category_ids() -> set:
+    ids = {TICKET_CATEGORY_ID, PURCHASES_CATEGORY_ID, NOT_RECEIVED_CATEGORY_ID, REPLACE_CATEGORY_ID, SUPPORT_CATEGORY_ID}
+    ids.discard(0)
+    return ids
+
+def ticket_record_from_channel(ch: discord.TextChannel, categories: set) -> Optional[dict]:
+    """Rebuild a TICKETS record from the channel topic (or name/overwrites for older tickets).
+
+    Channels without the topic marker are only adopted when they sit in a
+    configured ticket category, since adopted tickets can be auto-closed.
+    """
+    topic = ch.topic or ""
+    if not TOPIC_OPENER_RE.search(topic) and ch.category_id not in categories:
+        return None
+    kind = next((k for p, k in TICKET_PREFIXES.items() if ch.name.startswith(p)), None)
+    m = TOPIC_KIND_RE.match(topic)
+    if m and m.group(1) in TICKET_PREFIXES.values():
+        kind = m.group(1)
+    if kind is None:
+        return None
+    m = PRIORITY_TAG_RE.search(topic)
+    priority = m.group(1) if m else "normal"
+    m = TOPIC_OPENER_RE.search(topic)
+    opener_id = int(m.group(1)) if m else None
+    if opener_id is None:
+        # Older tickets: the opener is the only member with its own overwrite
+        opener_id = next((t.id for t in ch.overwrites if isinstance(t, discord.Member) and not t.bot), None)
+    return {
+        "guild_id": ch.guild.id,
+        "opener_id": opener_id,
+        "kind": kind,
+        "created_at": ch.created_at.timestamp(),
+        "status": "open",
+        "transcript_sent": False,
+        "priority": priority,
+        "assigned_id": None,
+    }
+
+async def reconcile_tickets() -> Dict[str, int]:
+    """Match TICKETS against the channel cache in one sweep and repair the difference.
+
+    Unavailable guilds (outage at on_ready) have an empty channel cache, so
+    they are skipped and their records are left alone rather than dropped.
+    """
+    swept = {g.id for g in bot.guilds if not g.unavailable}
+    all_swept = len(swept) == len(bot.guilds)
+    channels = {c.id: c for g in bot.guilds if g.id in swept for c in g.text_channels}
+    categories = ticket_category_ids()
+    report = {"open": 0, "repaired": 0, "stale": 0, "closes_finished": 0}
+
+    for cid in TICKETS.keys() - channels.keys():
+        gid = TICKETS[cid].get("guild_id")
+        if (gid in swept) if gid is not None else all_swept:
+            forget_ticket(cid)
+            report["stale"] += 1
+
+    for cid, ch in channels.items():
+        if cid in TICKETS:
+            continue
+        rec = ticket_record_from_channel(ch, categories)
+        if rec is None:
+            continue
+        TICKETS[cid] = rec
+        # Idle time counts from the last message, not from when the ticket was opened
+        last = discord.utils.snowflake_time(ch.last_message_id).timestamp() if ch.last_message_id else rec["created_at"]
+        IDLE.track(cid, last)
+        queue_ticket(cid)
+        report["repaired"] += 1
+    if report["repaired"]:
+        save_tickets()
+
+    for cid, rec in list(TICKETS.items()):
+        if rec.get("status") != "closing" or cid not in channels:
+            continue
+        ch = channels[cid]
+        try:
+            if not rec.get("transcript_sent"):
+                await archive_ticket(ch, closed_by="close resumed after restart")
+            await ch.delete(reason="Finishing interrupted close")
+            report["closes_finished"] += 1
+        except discord.HTTPException as e:
+            print(f"[RECONCILE] could not finish close of {cid}: {e}")
+
+    report["open"] = sum(1 for r in TICKETS.values() if r.get("status") == "open")
+    return report
 
 # -------------------- Checks --------------------
 def staff_only():
@@ -551,8 +978,39 @@ def owner_only():
         return interaction.user.id in {OWNER_ID, COOWNER_ID}
     return app_commands.check(predicate)
 
-# Crear el bot primero
+# -------------------- Command sync --------------------
+# tree.sync() is a rate-limited REST call; skip it when the command payload
+# (and target app/guild) is the same as last time.
+COMMANDS_HASH_PATH = "commands.sha256"
+
+async def sync_commands(force: bool = False) -> Optional[int]:
+    payload = json.dumps([c.to_dict(bot.tree) for c in bot.tree.get_commands()], sort_keys=True)
+    digest = hashlib.sha256(f"{bot.application_id}:{GUILD_ID}:{payload}".encode("utf-8")).hexdigest()
+    try:
+        with open(COMMANDS_HASH_PATH, "r", encoding="utf-8") as f:
+            previous = f.read().strip()
+    except OSError:
+        previous = ""
+    if not force and previous == digest:
+        print("[SYNC] comandos sin cambios, sync omitido")
+        return None
+
+    if GUILD_ID:
+        synced = await bot.tree.sync(guild=discord.Object(id=GUILD_ID))
+        print(f"[SYNC] {len(synced)} comandos sincronizados en guild {GUILD_ID}")
+    else:
+        synced = await bot.tree.sync()
+        print(f"[SYNC] {len(synced)} comandos sincronizados globalmente")
+    try:
+        with open(COMMANDS_HASH_PATH, "w", encoding="utf-8") as f:
+            f.write(digest)
+    except OSError:
+        pass
+    return len(synced)
+
+# The one bot instance: every command, view and event below is registered on it
 bot = NuvixBot()
+PROFILE: Dict[str, float] = {}
 
 # ────────────────────────────────────────────────
 # Slash commands
@@ -580,19 +1038,7 @@ async def cmd_assign(interaction: discord.Interaction, member: discord.Member):
 async def cmd_unassign(interaction: discord.Interaction):
     ch = interaction.channel
     assert isinstance(ch, discord.TextChannel)
-    base_msg = None
-    async for m in ch.history(limit=50, oldest_first=True):
-        if m.author == bot.user and m.embeds:
-            base_msg = m
-            break
-    if base_msg and base_msg.embeds:
-        e = base_msg.embeds[0]
-        new = make_embed(e.title or "Support Ticket", e.description or "")
-        for f in e.fields:
-            if f.name.lower().startswith("assigned"):
-                continue
-            new.add_field(name=f.name, value=f.value, inline=f.inline)
-        await base_msg.edit(embed=new)
+    await set_assignee(ch, None, interaction.user)
     await interaction.response.send_message("Unassigned.", ephemeral=True)
 
 @bot.tree.command(name="add", description="Add a user to this ticket")
@@ -602,6 +1048,7 @@ async def cmd_add(interaction: discord.Interaction, user: discord.Member):
     ch = interaction.channel
     assert isinstance(ch, discord.TextChannel)
     await ch.set_permissions(user, view_channel=True, send_messages=True, read_message_history=True)
+    EVENTS.append("member_added", channel_id=ch.id, actor_id=interaction.user.id, user_id=user.id)
     await interaction.response.send_message(f"Added {user.mention}.", ephemeral=True)
 
 @bot.tree.command(name="remove", description="Remove a user from this ticket")
@@ -611,6 +1058,7 @@ async def cmd_remove(interaction: discord.Interaction, user: discord.Member):
     ch = interaction.channel
     assert isinstance(ch, discord.TextChannel)
     await ch.set_permissions(user, overwrite=None)
+    EVENTS.append("member_removed", channel_id=ch.id, actor_id=interaction.user.id, user_id=user.id)
     await interaction.response.send_message(f"Removed {user.mention}.", ephemeral=True)
 
 @bot.tree.command(name="close", description="Close the current ticket (staff only)")
@@ -628,7 +1076,7 @@ async def cmd_transcript(interaction: discord.Interaction):
     await interaction.response.send_message("Transcript generated (see file below).", ephemeral=True)
     await ch.send(file=file)
 
-@bot.tree.command(name="ticket_priority", description="Set a priority tag in the channel topic")
+@bot.tree.command(name="ticket_priority", description="Set the ticket priority (used by /queue)")
 @staff_only()
 @app_commands.describe(level="Priority level")
 @app_commands.choices(level=[
@@ -638,15 +1086,76 @@ async def cmd_transcript(interaction: discord.Interaction):
     app_commands.Choice(name="critical", value="critical"),
 ])
 async def cmd_priority(interaction: discord.Interaction, level: app_commands.Choice[str]):
-    ch = interaction.channel
-    assert isinstance(ch, discord.TextChannel)
-    topic = ch.topic or ""
-    for tag in ("[P:low]", "[P:normal]", "[P:high]", "[P:critical]"):
-        topic = topic.replace(tag, "")
-    topic = f"{topic} [P:{level.value}]".strip()
-    await ch.edit(topic=topic)
+    rec = TICKETS.get(interaction.channel_id)
+    if rec is None:
+        await interaction.response.send_message("This is not a ticket channel.", ephemeral=True)
+        return
+    rec["priority"] = level.value
+    save_tickets()
+    EVENTS.append("priority_changed", channel_id=interaction.channel_id, actor_id=interaction.user.id, priority=level.value)
+    queue_ticket(interaction.channel_id)
+    schedule_topic_sync(interaction.channel_id)
     await interaction.response.send_message(f"Priority set to **{level.value}**.", ephemeral=True)
 
+@bot.tree.command(name="queue", description="Show the next tickets needing attention")
+@staff_only()
+@app_commands.describe(count="How many tickets to show (max 25)")
+async def cmd_queue(interaction: discord.Interaction, count: app_commands.Range[int, 1, 25] = 10):
+    lines = []
+    for i, cid in enumerate(QUEUE.top(count), 1):
+        rec = TICKETS[cid]
+        who = f"<@{rec['assigned_id']}>" if rec.get("assigned_id") else "*unassigned*"
+        lines.append(f"`{i}.` <#{cid}> • **{rec.get('priority', 'normal')}** • {who} • opened <t:{int(rec['created_at'])}:R>")
+    e = make_embed(f"Ticket queue ({len(QUEUE)} open)", "\n".join(lines) or "No open tickets.")
+    await interaction.response.send_message(embed=e, view=QueueView(), ephemeral=True)
+
+@bot.tree.command(name="export_events", description="Export the ticket event history (gzipped CSV or JSONL)")
+@staff_only()
+@app_commands.describe(fmt="File format")
+@app_commands.choices(fmt=[
+    app_commands.Choice(name="csv", value="csv"),
+    app_commands.Choice(name="jsonl", value="jsonl"),
+])
+async def cmd_export_events(interaction: discord.Interaction, fmt: app_commands.Choice[str]):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    await EVENTS.flush()
+    fd, path = tempfile.mkstemp(suffix=f".{fmt.value}.gz")
+    os.close(fd)
+    try:
+        count = await asyncio.to_thread(EVENTS.export, path, fmt.value)
+        file = discord.File(path, filename=f"ticket-events-{dt.datetime.now(dt.timezone.utc):%Y%m%d}.{fmt.value}.gz")
+        await interaction.followup.send(f"Exported {count} events.", file=file, ephemeral=True)
+    except (discord.HTTPException, OSError, EOFError) as e:
+        await interaction.followup.send(f"Export failed: {e}", ephemeral=True)
+    finally:
+        os.remove(path)
+
+@bot.tree.command(name="ratelimit_stats", description="Show rate limit / admission counters")
+@staff_only()
+async def cmd_ratelimit_stats(interaction: discord.Interaction):
+    stats = admission_stats()
+    lines = [f"**{name}:** " + " • ".join(f"{k} {v}" for k, v in counters.items()) for name, counters in stats.items()]
+    await interaction.response.send_message(embed=make_embed("Rate limits", "\n".join(lines)), ephemeral=True)
+
+lookup_group = app_commands.Group(name="lookup", description="Search the ticket history")
+
+@lookup_group.command(name="invoice", description="Find every ticket that mentions an invoice/order ID")
+@staff_only()
+@app_commands.describe(invoice_id="Invoice or order ID")
+async def cmd_lookup_invoice(interaction: discord.Interaction, invoice_id: app_commands.Range[str, 1, 120]):
+    rows = FORM_INDEX.lookup(invoice_id, INVOICE_FIELDS)
+    shown = discord.utils.escape_markdown(invoice_id)
+    if not rows:
+        await interaction.response.send_message(f"No tickets found for **{shown}**.", ephemeral=True)
+        return
+    body = f"**Invoice:** {shown}\n\n" + "\n".join(describe_indexed_ticket(r) for r in rows[:20])
+    if len(rows) > 20:
+        body += f"\n…and {len(rows) - 20} more"
+    e = make_embed(f"Invoice lookup — {len(rows)} ticket(s)", body[:4096])
+    await interaction.response.send_message(embed=e, ephemeral=True)
+
+bot.tree.add_command(lookup_group)
+
 @bot.tree.command(name="blacklist", description="Manage ticket blacklist")
 @staff_only()
 @app_commands.describe(action="add/remove/list", user="Target user (add/remove)")
@@ -705,18 +1214,19 @@ async def cmd_help(interaction: discord.Interaction):
         "`/panel` — Post the ticket panel",
         "`/assign [member]` • `/unassign`",
         "`/add [user]` • `/remove [user]`",
-        "`/close` • `/transcript`",
-        "`/ticket_priority [low|normal|high|critical]`",
+        "`/close` • `/transcript` • `/export_events [csv|jsonl]`",
+        "`/ticket_priority [low|normal|high|critical]` • `/queue [count]`",
         "",
         "**Moderation**",
         "`/blacklist add|remove|list [user]`",
+        "`/lookup invoice [id]` — Tickets that used an invoice",
         "",
         "**Stats (placeholders)**",
         "`/staffstats_me` • `/staffstats_user [member]`",
         "`/staffstats_leaderboard` • `/staffstats_monthclaims [count]`",
         "",
         "**Utils**",
-        "`/ping` • `/sync` (owner only)",
+        "`/ping` • `/ratelimit_stats` • `/sync` (owner only)",
     ]
     e = make_embed("Nuvix Tickets — Help", "\n".join(lines))
     await interaction.response.send_message(embed=e, ephemeral=True)
@@ -724,39 +1234,61 @@ async def cmd_help(interaction: discord.Interaction):
 @bot.tree.command(name="sync", description="Sync application commands (owner only)")
 @owner_only()
 async def cmd_sync(interaction: discord.Interaction):
+    count = await sync_commands(force=True)
     if GUILD_ID:
-        guild = discord.Object(id=GUILD_ID)
-        synced = await bot.tree.sync(guild=guild)
-        await interaction.response.send_message(f"Synced {len(synced)} commands to guild `{GUILD_ID}`.", ephemeral=True)
+        await interaction.response.send_message(f"Synced {count} commands to guild `{GUILD_ID}`.", ephemeral=True)
     else:
-        synced = await bot.tree.sync()
-        await interaction.response.send_message(f"Globally synced {len(synced)} commands.", ephemeral=True)
+        await interaction.response.send_message(f"Globally synced {count} commands.", ephemeral=True)
 
 # -------------------- Events --------------------
 @bot.event
 async def on_ready():
+    global _reconciled, _backfill_task
     print(f"[READY] Logged in as {bot.user}")
 
-    # ✅ Actualiza la presencia dinámica (Watching X tickets abiertos)
-    open_tickets = len([
-        c for c in bot.get_all_channels()
-        if isinstance(c, discord.TextChannel)
-        and any(c.name.startswith(p) for p in ("purch-", "nrcv-", "repl-", "supp-"))
-    ])
+    # Reconnects fire on_ready again; the TICKETS state is already in sync by then
+    if not _reconciled:
+        _reconciled = True
+        if STARTUP_PROFILE:
+            print(
+                f"[PROFILE] import {PROFILE.get('import', 0):.2f}s • setup_hook {PROFILE.get('setup_hook', 0):.2f}s"
+                f" • ready {time.perf_counter() - _T_START:.2f}s after start"
+            )
+        report = await reconcile_tickets()
+        print(f"[RECONCILE] {report}")
+        if report["repaired"] or report["stale"] or report["closes_finished"]:
+            await log_to(PRIVATE_BOT_LOGS_CHANNEL_ID, embed=make_embed(
+                "Ticket state reconciled",
+                f"**Open:** {report['open']}\n**Repaired from topics:** {report['repaired']}\n"
+                f"**Stale records dropped:** {report['stale']}\n**Interrupted closes finished:** {report['closes_finished']}",
+            ))
+        _backfill_task = asyncio.create_task(backfill_form_index())
+
+    IDLE.start()
+    EVENTS.start()
 
+    # ✅ Actualiza la presencia dinámica (Watching X tickets abiertos)
     await bot.change_presence(
         activity=discord.Activity(
             type=discord.ActivityType.watching,
-            name=f"{open_tickets} tickets abiertos"
+            name=f"{len(TICKETS)} tickets abiertos"
         )
     )
 
-    await log_channel(
-        bot,
+    await log_to(
         PRIVATE_BOT_LOGS_CHANNEL_ID,
-        make_embed(f"{BOT_NAME} online", f"— {now_utc_str()}")
+        embed=make_embed(f"{BOT_NAME} online", f"— {now_utc_str()}")
     )
 
+@bot.listen("on_guild_channel_delete")
+async def drop_deleted_ticket(channel: discord.abc.GuildChannel):
+    forget_ticket(channel.id)
+
+@bot.listen("on_message")
+async def track_ticket_activity(message: discord.Message):
+    if not message.author.bot and message.channel.id in TICKETS:
+        IDLE.touch(message.channel.id)
+
 @bot.event
 async def on_app_command_completion(interaction: discord.Interaction, command: app_commands.Command):
     await log_to(LOGS_CMD_USE_CHANNEL_ID, embed=make_embed("Command used", f"`/{command.name}` by {interaction.user.mention} in {interaction.channel.mention}"))
@@ -766,27 +1298,13 @@ async def on_command_error(ctx: commands.Context, error: commands.CommandError):
     tb = "".join(traceback.format_exception(type(error), error, error.__traceback__))
     print(tb)
 
-# ─────────────────────────────────────────────────────────────────────────────
-# FORCE SYNC DE COMANDOS
-# ─────────────────────────────────────────────────────────────────────────────
-import asyncio
-
-async def force_sync():
-    await bot.wait_until_ready()
-    if GUILD_ID:
-        guild = discord.Object(id=GUILD_ID)
-        synced = await bot.tree.sync(guild=guild)
-        print(f"[FORCE SYNC] {len(synced)} comandos sincronizados en guild {GUILD_ID}")
-    else:
-        synced = await bot.tree.sync()
-        print(f"[FORCE SYNC] {len(synced)} comandos sincronizados globalmente")
+PROFILE["import"] = time.perf_counter() - _T_START
 
 # ─────────────────────────────────────────────────────────────────────────────
 # MAIN
 # ─────────────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     if KEEPALIVE:
-        Thread(target=run_flask, daemon=True).start()
+        start_keepalive()
 
-    bot = NuvixBot()
     bot.run(TOKEN)
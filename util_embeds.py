@@ -0,0 +1,87 @@
+from typing import Iterable, Optional, Tuple
+
+import discord
+
+Field = Tuple[str, str, bool]
+
+
+class EmbedTemplate:
+    """Fixed parts of an embed (branding + any fixed title/description/fields).
+
+    build() goes through the public Embed constructor and setters every time;
+    the template only saves re-stating the branding and fixed fields at each
+    call site.
+    """
+
+    def __init__(
+        self,
+        color: int,
+        author: str = "",
+        icon_url: str = "",
+        thumbnail_url: str = "",
+        footer: str = "",
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        fields: Iterable[Field] = (),
+    ):
+        self.color = color
+        self.author = author
+        self.icon_url = icon_url
+        self.thumbnail_url = thumbnail_url
+        self.footer = footer
+        self.title = title
+        self.description = description
+        self.fields = tuple(fields)
+
+    @classmethod
+    def branded(cls, *, color: int, author: str, icon_url: str = "", thumbnail_url: str = "", footer: str = "") -> "EmbedTemplate":
+        return cls(color, author, icon_url, thumbnail_url, footer)
+
+    def derive(
+        self,
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        fields: Iterable[Field] = (),
+    ) -> "EmbedTemplate":
+        """A new template with a fixed title/description and extra fixed fields."""
+        return EmbedTemplate(
+            self.color,
+            self.author,
+            self.icon_url,
+            self.thumbnail_url,
+            self.footer,
+            self.title if title is None else title,
+            self.description if description is None else description,
+            self.fields + tuple(fields),
+        )
+
+    def build(
+        self,
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        color: Optional[int] = None,
+        fields: Iterable[Field] = (),
+    ) -> discord.Embed:
+        e = discord.Embed(
+            title=self.title if title is None else title,
+            description=self.description if description is None else description,
+            color=color or self.color,
+        )
+        e.set_author(name=self.author, icon_url=self.icon_url or None)
+        if self.thumbnail_url:
+            e.set_thumbnail(url=self.thumbnail_url)
+        e.set_footer(text=self.footer)
+        for name, value, inline in self.fields:
+            e.add_field(name=name, value=value, inline=inline)
+        for name, value, inline in fields:
+            e.add_field(name=name, value=value, inline=inline)
+        return e
+
+
+def patch_field(embed: discord.Embed, prefix: str, name: str, value: str, inline: bool = False) -> discord.Embed:
+    """Replace the first field whose name starts with `prefix` (case-insensitive), or insert it first."""
+    prefix = prefix.lower()
+    for i, f in enumerate(embed.fields):
+        if (f.name or "").lower().startswith(prefix):
+            return embed.set_field_at(i, name=name, value=value, inline=inline)
+    return embed.insert_field_at(0, name=name, value=value, inline=inline)
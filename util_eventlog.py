@@ -0,0 +1,161 @@
+import asyncio
+import csv
+import glob
+import gzip
+import json
+import os
+import shutil
+import time
+import traceback
+from typing import Any, Dict, Iterator, List, Optional
+
+CSV_COLUMNS = ["seq", "ts", "time", "type", "channel_id", "actor_id", "data"]
+
+
+class EventLog:
+    """Append-only JSONL log of ticket lifecycle events.
+
+    append() only buffers; a background task group-commits the buffer from
+    a worker thread (one write + fsync per batch). Every `snapshot_every`
+    events the sequence number is snapshotted and the active log is rotated
+    into a gzipped archive segment, so startup replay reads at most one
+    segment while exports still see the full history. The log is history
+    only: tickets.json remains the source of truth for live ticket state.
+    """
+
+    def __init__(self, directory: str, snapshot_every: int = 5000, flush_interval: float = 0.5):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.flush_interval = flush_interval
+        self.log_path = os.path.join(directory, "events.jsonl")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.archive_dir = os.path.join(directory, "archive")
+        self.seq = 0
+        self._snapshot_seq = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    # -------------------- Startup --------------------
+    def replay(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            self.seq = snap["seq"]
+        except FileNotFoundError:
+            pass
+        self._snapshot_seq = self.seq
+        for ev in self._read_lines(self.log_path):
+            self.seq = max(self.seq, ev["seq"])
+
+    @staticmethod
+    def _read_lines(path: str) -> Iterator[Dict[str, Any]]:
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+        except FileNotFoundError:
+            return
+        except (EOFError, gzip.BadGzipFile):
+            return  # truncated or corrupt segment: keep what was readable
+
+    # -------------------- Writing --------------------
+    def append(self, type: str, **data: Any):
+        self.seq += 1
+        ev = {"seq": self.seq, "ts": time.time(), "type": type, **data}
+        self._pending.append(ev)
+        if self._wake is not None and len(self._pending) >= 256:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                traceback.print_exc()
+
+    async def flush(self):
+        async with self._lock:
+            if self._pending:
+                batch, self._pending = self._pending, []
+                await asyncio.to_thread(self._write_batch, batch)
+            if self.seq - self._snapshot_seq >= self.snapshot_every:
+                snapshot = json.dumps({"seq": self.seq})
+                await asyncio.to_thread(self._compact, snapshot, self.seq)
+                self._snapshot_seq = self.seq
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in batch))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self, snapshot: str, seq: int):
+        # Snapshot first, and the segment under a temp name: a crash at any point
+        # leaves either no segment or a complete one, plus events in both files at
+        # worst, which iter_events de-duplicates
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        segment = os.path.join(self.archive_dir, f"events-{seq:012d}.jsonl.gz")
+        tmp = f"{segment}.tmp"
+        with open(self.log_path, "rb") as src, open(tmp, "wb") as raw:
+            with gzip.open(raw, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, segment)
+        os.truncate(self.log_path, 0)
+
+    # -------------------- Export --------------------
+    def iter_events(self) -> Iterator[Dict[str, Any]]:
+        """Full history, oldest first, one event at a time."""
+        last = 0
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, "events-*.jsonl.gz"))) + [self.log_path]:
+            for ev in self._read_lines(path):
+                if ev["seq"] > last:  # a crash mid-rotation can leave an event in two files
+                    last = ev["seq"]
+                    yield ev
+
+    def export(self, out_path: str, fmt: str) -> int:
+        """Stream the history to `out_path` as gzipped "csv" or "jsonl"; returns the event count. Blocking."""
+        count = 0
+        with gzip.open(out_path, "wt", encoding="utf-8", newline="") as out:
+            writer = csv.writer(out) if fmt == "csv" else None
+            if writer:
+                writer.writerow(CSV_COLUMNS)
+            for ev in self.iter_events():
+                count += 1
+                if writer is None:
+                    out.write(json.dumps(ev, ensure_ascii=False) + "\n")
+                    continue
+                rest = {k: v for k, v in ev.items() if k not in CSV_COLUMNS}
+                writer.writerow([
+                    ev["seq"],
+                    ev["ts"],
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ev["ts"])),
+                    ev["type"],
+                    ev.get("channel_id", ""),
+                    ev.get("actor_id", ""),
+                    json.dumps(rest, ensure_ascii=False) if rest else "",
+                ])
+        return count
@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import json
+import os
+import time
+import traceback
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+Callback = Callable[[int], Awaitable[None]]
+
+
+class InactivityScheduler:
+    """Deadline heap for idle tickets.
+
+    Activity only bumps a timestamp (O(1)); the heap keeps one entry per
+    channel and stale entries are re-pushed lazily when they reach the top,
+    so each reminder/close costs O(log n) no matter how busy the ticket is.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        remind_after: float,
+        close_after: float,
+        on_remind: Callback,
+        on_close: Callback,
+        flush_interval: float = 30.0,
+    ):
+        self.path = path
+        self.remind_after = remind_after  # seconds, 0 disables the reminder
+        self.close_after = close_after    # seconds after the reminder, 0 disables auto-close
+        self.flush_interval = flush_interval
+        self._on_remind = on_remind
+        self._on_close = on_close
+        self._last: Dict[int, float] = {}
+        self._reminded: Dict[int, float] = {}
+        self._scheduled: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._dirty = False
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._callbacks: Set[asyncio.Task] = set()  # strong refs: the loop only keeps weak ones
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.remind_after or self.close_after)
+
+    def __len__(self) -> int:
+        return len(self._last)
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._last
+
+    # -------------------- Persistence --------------------
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        for cid, st in data.items():
+            cid = int(cid)
+            self._last[cid] = float(st["last"])
+            if st.get("reminded") is not None:
+                self._reminded[cid] = float(st["reminded"])
+            self._schedule(cid)
+
+    def _snapshot(self) -> Dict[str, dict]:
+        return {
+            str(cid): {"last": last, "reminded": self._reminded.get(cid)}
+            for cid, last in self._last.items()
+        }
+
+    def _write(self, data: Dict[str, dict]):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write, self._snapshot())
+        except Exception:
+            self._dirty = True
+            traceback.print_exc()
+
+    # -------------------- Tracking --------------------
+    def track(self, channel_id: int, last_activity: Optional[float] = None):
+        if channel_id in self._last:
+            return
+        self._last[channel_id] = last_activity or time.time()
+        self._dirty = True
+        self._schedule(channel_id)
+
+    def touch(self, channel_id: int):
+        if channel_id in self._last:
+            self._last[channel_id] = time.time()
+            self._dirty = True
+            # Re-arm tickets whose entry was dropped (e.g. reminded with auto-close off)
+            self._schedule(channel_id)
+
+    def untrack(self, channel_id: int):
+        self._last.pop(channel_id, None)
+        self._reminded.pop(channel_id, None)
+        self._scheduled.pop(channel_id, None)
+        self._dirty = True
+
+    def deadline(self, channel_id: int) -> Optional[float]:
+        last = self._last.get(channel_id)
+        if last is None:
+            return None
+        reminded = self._reminded.get(channel_id)
+        if reminded is not None and reminded >= last:
+            return reminded + self.close_after if self.close_after else None
+        if self.remind_after:
+            return last + self.remind_after
+        return last + self.close_after if self.close_after else None
+
+    def _schedule(self, channel_id: int):
+        due = self.deadline(channel_id)
+        if due is None or channel_id in self._scheduled:
+            return
+        self._scheduled[channel_id] = due
+        heapq.heappush(self._heap, (due, channel_id))
+        if self._wake and self._heap[0][1] == channel_id:
+            self._wake.set()
+
+    # -------------------- Loop --------------------
+    def start(self):
+        if self._task is None and self.enabled:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def _fire(self, callback: Callback, channel_id: int):
+        async def runner():
+            try:
+                await callback(channel_id)
+            except Exception:
+                traceback.print_exc()
+        task = asyncio.create_task(runner())
+        self._callbacks.add(task)
+        task.add_done_callback(self._callbacks.discard)
+
+    def _pop_due(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            due, cid = heapq.heappop(self._heap)
+            if self._scheduled.get(cid) != due:
+                continue  # untracked (or re-tracked) since this entry was pushed
+            del self._scheduled[cid]
+            actual = self.deadline(cid)
+            if actual is None:
+                continue
+            if actual > now:
+                self._schedule(cid)  # activity moved the deadline
+                continue
+            reminded = self._reminded.get(cid)
+            if self.remind_after and (reminded is None or reminded < self._last[cid]):
+                self._reminded[cid] = now
+                self._dirty = True
+                self._schedule(cid)
+                self._fire(self._on_remind, cid)
+            else:
+                self.untrack(cid)
+                self._fire(self._on_close, cid)
+
+    async def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            self._wake.clear()
+            self._pop_due(time.time())
+            if time.monotonic() >= next_flush:
+                await self.flush()
+                next_flush = time.monotonic() + self.flush_interval
+            timeout = next_flush - time.monotonic()
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - time.time())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,82 @@
+import re
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Set
+
+_SPACES = re.compile(r"[\s#]+")
+
+
+def normalize(value: str) -> str:
+    """Canonical form used as the index key ("  #INV 123 " -> "inv123")."""
+    return _SPACES.sub("", value).casefold()
+
+
+class FormIndex:
+    """Every ticket form field ever submitted, keyed by normalized value.
+
+    Backed by a local SQLite file so lookups stay an index seek across the
+    full ticket history, open and closed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.row_factory = sqlite3.Row
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS tickets (
+                    channel_id   INTEGER PRIMARY KEY,
+                    channel_name TEXT,
+                    opener_id    INTEGER,
+                    kind         TEXT,
+                    created_at   REAL,
+                    closed_at    REAL
+                );
+                CREATE TABLE IF NOT EXISTS form_fields (
+                    channel_id INTEGER,
+                    field      TEXT,
+                    value      TEXT,
+                    key        TEXT
+                );
+                CREATE INDEX IF NOT EXISTS form_fields_key ON form_fields (key, field);
+                """
+            )
+        return self._db
+
+    def add(self, channel_id: int, channel_name: str, opener_id: int, kind: str, created_at: float, fields: Dict[str, str]):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?, ?, NULL)",
+                (channel_id, channel_name, opener_id, kind, created_at),
+            )
+            self.db.executemany(
+                "INSERT INTO form_fields VALUES (?, ?, ?, ?)",
+                [(channel_id, k, v, normalize(v)) for k, v in fields.items() if v.strip()],
+            )
+
+    def indexed_ids(self) -> Set[int]:
+        return {row[0] for row in self.db.execute("SELECT channel_id FROM tickets")}
+
+    def mark_closed(self, channel_id: int, closed_at: float):
+        with self.db:
+            self.db.execute(
+                "UPDATE tickets SET closed_at = ? WHERE channel_id = ? AND closed_at IS NULL",
+                (closed_at, channel_id),
+            )
+
+    def lookup(self, value: str, fields: Iterable[str], exclude: Optional[int] = None) -> List[sqlite3.Row]:
+        """Tickets whose form has `value` in one of `fields`, oldest first."""
+        fields = list(fields)
+        marks = ",".join("?" * len(fields))
+        return self.db.execute(
+            f"""
+            SELECT DISTINCT t.* FROM form_fields f JOIN tickets t USING (channel_id)
+            WHERE f.key = ? AND f.field IN ({marks}) AND t.channel_id IS NOT ?
+            ORDER BY t.created_at
+            """,
+            (normalize(value), *fields, exclude),
+        ).fetchall()
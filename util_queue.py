@@ -0,0 +1,64 @@
+import heapq
+import itertools
+from typing import Callable, Dict, List, Optional, Tuple
+
+PRIORITY_RANK = {"critical": 0, "high": 1, "normal": 2, "low": 3}
+
+# (priority rank, created_at, assigned, seq, channel_id)
+Entry = Tuple[int, float, int, int, int]
+
+
+class TicketQueue:
+    """Open tickets ordered by priority, then age, then unassigned first.
+
+    Updates push a fresh entry and invalidate the old one through its
+    sequence number; stale entries are skipped on read and swept out once
+    they outnumber the live ones.
+    """
+
+    def __init__(self):
+        self._heap: List[Entry] = []
+        self._live: Dict[int, int] = {}  # channel_id -> seq of its current entry
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._live
+
+    def upsert(self, channel_id: int, priority: str, created_at: float, assigned: bool):
+        seq = next(self._seq)
+        self._live[channel_id] = seq
+        heapq.heappush(self._heap, (PRIORITY_RANK.get(priority, PRIORITY_RANK["normal"]), created_at, int(assigned), seq, channel_id))
+        self._maybe_compact()
+
+    def remove(self, channel_id: int):
+        self._live.pop(channel_id, None)
+        self._maybe_compact()
+
+    def _valid(self, entry: Entry) -> bool:
+        return self._live.get(entry[4]) == entry[3]
+
+    def _maybe_compact(self):
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [e for e in self._heap if self._valid(e)]
+            heapq.heapify(self._heap)
+
+    def top(self, k: int, where: Optional[Callable[[int], bool]] = None) -> List[int]:
+        """First k channel ids in queue order, in O(k log k) heap-tree steps (plus skipped entries)."""
+        out: List[int] = []
+        heap = self._heap
+        frontier: List[Tuple[Entry, int]] = [(heap[0], 0)] if heap else []
+        while frontier and len(out) < k:
+            entry, i = heapq.heappop(frontier)
+            if self._valid(entry) and (where is None or where(entry[4])):
+                out.append(entry[4])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return out
+
+    def first(self, where: Optional[Callable[[int], bool]] = None) -> Optional[int]:
+        found = self.top(1, where)
+        return found[0] if found else None
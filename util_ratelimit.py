@@ -0,0 +1,120 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"{reason}: retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionRejected(RateLimited):
+    """Raised by AdmissionQueue.slot() when the wait list is full or the wait timed out."""
+
+
+class RateLimiter:
+    """Token buckets keyed by user/guild id: `burst` tokens, refilled at `rate` per second.
+
+    Buckets are kept in LRU order and capped at `max_keys`; an evicted bucket
+    is simply recreated full, which only ever errs on the permissive side.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def retry_after(self, key: Hashable, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now)."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        missing = cost - self._tokens(key, now)
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, key: Hashable, cost: float = 1.0, now: Optional[float] = None):
+        if self.rate <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        self._buckets[key] = (self._tokens(key, now) - cost, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class AdmissionQueue:
+    """At most `max_inflight` admitted operations, `max_queue` waiting behind them.
+
+    Arrivals beyond that, or that wait longer than `max_wait`, are rejected
+    immediately instead of piling up against the REST API.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int, max_wait: float = 2.0):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._sem = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._sem.locked():
+            if self.waiting >= self.max_queue:
+                raise AdmissionRejected(self.max_wait, "admission queue full")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                raise AdmissionRejected(self.max_wait, "admission queue timeout") from None
+            finally:
+                self.waiting -= 1
+        else:
+            await self._sem.acquire()
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._sem.release()
+
+
+class AdmissionControl:
+    """Per-user + per-guild token buckets and an admission queue for one class of interaction, with counters.
+
+    Each class gets its own queue so slow operations of one kind (e.g. closes
+    that archive a transcript) can't crowd out another (e.g. ticket creation).
+    """
+
+    def __init__(self, name: str, user: RateLimiter, guild: RateLimiter, queue: AdmissionQueue):
+        self.name = name
+        self.user = user
+        self.guild = guild
+        self.queue = queue
+        self.counters: Dict[str, int] = {"admitted": 0, "rejected_user": 0, "rejected_guild": 0, "rejected_queue": 0}
+
+    def check(self, user_id: int, guild_id: int, consume: bool = True):
+        """Raise RateLimited if either bucket is empty; otherwise take from both (when `consume`)."""
+        now = time.monotonic()
+        wait_user = self.user.retry_after(user_id, now=now)
+        wait_guild = self.guild.retry_after(guild_id, now=now)
+        if wait_user or wait_guild:
+            reason = "user" if wait_user >= wait_guild else "guild"
+            self.counters[f"rejected_{reason}"] += 1
+            raise RateLimited(max(wait_user, wait_guild), f"{reason} rate limit")
+        if consume:
+            self.user.take(user_id, now=now)
+            self.guild.take(guild_id, now=now)
+            self.counters["admitted"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "inflight": self.queue.inflight, "waiting": self.queue.waiting}